@@ -15,22 +15,25 @@ Required Environment Variables:
 Arguments:
     -t, --instance-type INSTANCE_TYPE  EC2 instance type (e.g. g5.12xlarge)
     -c, --count COUNT                  Number of instances to create (default: 1)
-    -i, --retry-interval INTERVAL      Retry interval in seconds (default: 10)
-    -r, --max-retry MAX                Number of max retry times(default: 10)
+    -i, --retry-interval INTERVAL      Capacity retry interval in seconds, caps backoff at 8x (default: 10)
+    -r, --max-retry MAX                Number of max retry times per API call and for capacity (default: 10)
 
 Examples:
-    # Basic usage with default retry interval (10 seconds)
+    # Basic usage; capacity backoff capped at 80 seconds (default -i 10)
     python ec2-auto-create.py -t g5.12xlarge -c 2
     
-    # Custom retry interval of 15 seconds
+    # Capacity backoff capped at 120 seconds, up to 20 retries
     python ec2-auto-create.py -t g5.12xlarge -c 2 -i 15 -r 20
     
     # Minimal configuration example
     python ec2-auto-create.py --instance-type t2.micro --count 1 
 
 Error Handling:
-    - Retries for common AWS API errors with exponential backoff
+    - Throttling, 5xx and network errors are retried by botocore's adaptive retry mode
+    - Insufficient capacity is retried with exponential backoff and full jitter
     - Exits with error code 1 for critical failures
+    - Ctrl-C stops after the current request and skips remaining retries (exit code 130);
+      press it again to abort immediately
 
 DISCLAIMER: This code is provided for educational and informational purposes only.
 It should not be used in production environments without proper review, testing,
@@ -45,9 +48,16 @@ Features:
 """
 import os
 import time
+import uuid
+import queue
+import logging
+import random
+import signal
 import argparse
+import threading
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Constants (UPPER_CASE_WITH_UNDERSCORES)
@@ -61,91 +71,232 @@ SECURITY_GROUP_IDS = ["sg-xxx"]  # Security group IDs
 SUBNET_ID = "subnet-xxx"          # VPC subnet ID
 TAG_KEY = "demo"                # Resource tag key
 TAG_VALUE = "true"              # Resource tag value
+TAG_SPEC = [{                   # RunInstances tag specification, built once
+    'ResourceType': 'instance',
+    'Tags': [{'Key': TAG_KEY, 'Value': TAG_VALUE}]
+}]
 SNS_TOPIC_ARN = "arn:aws-cn:sns:xxx"  # SNS topic arn
+SNS_BATCH_SIZE = 10             # Max entries per SNS PublishBatch call
+SNS_PUBLISH_ATTEMPTS = 3        # Attempts for entries that fail inside a batch
+SNS_FLUSH_INTERVAL = 0.2        # Max seconds a notification waits for its batch to fill
+SNS_RETRY_INTERVAL = 1          # Backoff interval for re-published entries; capped at 8x
 
+# Retry backoff ("Full Jitter"): sleep a random time in [0, min(cap, base * 2**attempt)]
+BACKOFF_BASE = 1.0              # Base backoff in seconds
+BACKOFF_CAP_MULTIPLIER = 8      # Backoff cap as a multiple of the retry interval
 
-def create_ec2_client(access_key: str, secret_key: str) -> boto3.client:
-    """Create and configure EC2 client with AWS credentials."""
+MAX_POOL_CONNECTIONS = 50       # HTTP connections per client
+
+logger = logging.getLogger(__name__)
+
+# Set on SIGINT; ends the backoff wait and stops further launch attempts.
+# A plain flag rather than a threading.Event, so the signal handler never takes a lock.
+abort_requested = False
+ABORT_POLL_INTERVAL = 0.5       # Seconds between abort checks while backing off
+
+# Capacity errors botocore does not retry; RunInstances is replayed with backoff
+RETRYABLE_EC2_ERRORS = frozenset({
+    'InsufficientInstanceCapacity'
+})
+
+
+def handle_sigint(signum, frame) -> None:
+    """Request a graceful abort on the first Ctrl-C, force it on the second."""
+    global abort_requested
+    if abort_requested:
+        raise KeyboardInterrupt
+    abort_requested = True
+
+def wait_for_abort(delay: float) -> bool:
+    """Sleep up to delay seconds in short slices; return True if an abort was requested."""
+    deadline = time.monotonic() + delay
+    while not abort_requested:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(ABORT_POLL_INTERVAL, remaining))
+    return True
+
+def create_session(access_key: str, secret_key: str) -> boto3.Session:
+    """Create a boto3 session with AWS credentials, shared by all clients."""
     return boto3.Session(
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key
-    ).client('ec2')
-
-def handle_api_errors(error: ClientError, instance_type: str) -> bool:
-    """Handle common EC2 API errors with appropriate retry logic."""
-    error_code = error.response['Error']['Code']
-    retry_errors = {
-        'IdempotentParameterMismatch': 'Safe to retry immediately',
-        'InsufficientInstanceCapacity': f'Insufficient capacity for {instance_type}',
-        'RequestLimitExceeded': 'AWS API request limit exceeded',
-        'ServiceUnavailable': 'EC2 service unavailable',
-        'Unsupported': f'Instance type {instance_type} not supported'
-    }
-
-    if error_code in retry_errors:
-        print(f"{retry_errors[error_code]}, retrying...")
-        return True
-    print(f"Unhandled error code: {error_code}")
-    return False
+    )
+
+def create_client_config(max_retry: int) -> Config:
+    """Build the client config shared by all clients.
+
+    Retries for throttling (RequestLimitExceeded), 5xx and transient network
+    errors are delegated to botocore's adaptive retry mode, which adds jittered
+    exponential backoff and a client-side token bucket that slows requests
+    down under throttling.
+    """
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={'mode': 'adaptive', 'max_attempts': max_retry}
+    )
+
+def create_ec2_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure EC2 client from a shared session."""
+    return session.client('ec2', config=config)
+
+def create_sns_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure SNS client from a shared session."""
+    return session.client('sns', config=config)
+
+def backoff_delay(retry_attempts: int, retry_interval: int) -> float:
+    """Return a full-jitter exponential backoff delay in seconds."""
+    backoff_cap = retry_interval * BACKOFF_CAP_MULTIPLIER
+    return random.uniform(0, min(backoff_cap, BACKOFF_BASE * (2 ** retry_attempts)))
+
+def publish_notification_batch(sns_client: boto3.client, batch: list) -> list:
+    """Publish one SNS batch and return the entries that are worth retrying."""
+    try:
+        response = sns_client.publish_batch(
+            TopicArn=SNS_TOPIC_ARN,
+            PublishBatchRequestEntries=batch
+        )
+    except Exception as sns_error:
+        logger.error("Failed to send notifications: %s", sns_error)
+        return []
+
+    retry_entries = []
+    for success in response.get('Successful', []):
+        logger.info("Launch notification sent for instance %s", success['Id'])
+    for failure in response.get('Failed', []):
+        logger.error("Failed to send notification for instance %s: %s",
+                     failure['Id'], failure.get('Message', failure['Code']))
+        # Sender faults (e.g. invalid parameters) will not succeed on retry
+        if not failure.get('SenderFault'):
+            retry_entries.extend(entry for entry in batch if entry['Id'] == failure['Id'])
+    return retry_entries
+
+def deliver_notification_batch(sns_client: boto3.client, batch: list) -> None:
+    """Publish one SNS batch, re-batching failed entries with backoff."""
+    for attempt in range(SNS_PUBLISH_ATTEMPTS):
+        if attempt:
+            # Runs on the notification worker, so backing off never delays launches
+            time.sleep(backoff_delay(attempt, SNS_RETRY_INTERVAL))
+        batch = publish_notification_batch(sns_client, batch)
+        if not batch:
+            return
+
+def notification_worker(sns_client: boto3.client, notify_queue: queue.Queue) -> None:
+    """Drain launch notifications from the queue until a None sentinel arrives.
+
+    Entries are flushed as a PublishBatch once SNS_BATCH_SIZE accumulate or the
+    oldest has waited SNS_FLUSH_INTERVAL seconds.
+    """
+    pending = []
+    deadline = 0.0
+    while True:
+        timeout = max(0.0, deadline - time.monotonic()) if pending else None
+        try:
+            item = notify_queue.get(timeout=timeout)
+        except queue.Empty:
+            deliver_notification_batch(sns_client, pending)
+            pending = []
+            continue
+        if item is None:
+            break
+
+        instance_id, instance_type = item
+        if not pending:
+            deadline = time.monotonic() + SNS_FLUSH_INTERVAL
+        pending.append({
+            'Id': instance_id,
+            'Message': f"EC2 instance successfully launched!\nInstance ID: {instance_id}\nInstance Type: {instance_type}",
+            'Subject': f"EC2 Instance {instance_id} Launch Notification"
+        })
+        if len(pending) >= SNS_BATCH_SIZE:
+            deliver_notification_batch(sns_client, pending)
+            pending = []
+
+    if pending:
+        deliver_notification_batch(sns_client, pending)
+
+def start_notification_worker(sns_client: boto3.client) -> tuple:
+    """Start the background SNS notification worker and return its queue and thread."""
+    notify_queue = queue.Queue()
+    worker = threading.Thread(
+        target=notification_worker,
+        args=(sns_client, notify_queue),
+        name='sns-notifier',
+        daemon=True
+    )
+    worker.start()
+    return notify_queue, worker
+
+def stop_notification_worker(notify_queue: queue.Queue, worker: threading.Thread) -> None:
+    """Flush queued notifications and wait for the worker to exit."""
+    notify_queue.put(None)
+    worker.join()
 
 def launch_instances(
     ec2_client: boto3.client,
+    notify_queue: queue.Queue,
     instance_type: str,
     target_count: int,
     retry_interval: int,
     max_retry: int
-) -> None:
-    """Launch EC2 instances with retry logic and exponential backoff."""
+) -> int:
+    """Launch EC2 instances in batched RunInstances calls, backing off while capacity is insufficient.
+
+    Throttling and service errors are retried inside the client; only the
+    capacity errors in RETRYABLE_EC2_ERRORS, which botocore does not retry,
+    are replayed here. Launch notifications are handed to the background
+    notification worker so SNS latency stays off the launch path. Returns the
+    number of instances that were not launched.
+    """
     instances_remaining = target_count
     retry_attempts = 0
     
-    # 创建SNS客户端
-    sns_client = boto3.client('sns',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
-    
-    while instances_remaining > 0 and retry_attempts < max_retry:
+    while instances_remaining > 0 and retry_attempts < max_retry and not abort_requested:
+        # One idempotency token per RunInstances request: botocore's internal retries
+        # (timeouts, 5xx) resend identical parameters, so EC2 dedupes a request that
+        # succeeded server-side instead of launching duplicate instances.
+        client_token = uuid.uuid4().hex
         try:
             response = ec2_client.run_instances(
+                ClientToken=client_token,
                 ImageId=AMI_ID,
                 InstanceType=instance_type,
                 MinCount=1,
-                MaxCount=1,
+                MaxCount=instances_remaining,
                 KeyName=KEY_PAIR_NAME,
-                TagSpecifications=[{
-                    'ResourceType': 'instance',
-                    'Tags': [{'Key': TAG_KEY, 'Value': TAG_VALUE}]
-                }],
+                TagSpecifications=TAG_SPEC,
                 SubnetId=SUBNET_ID,
                 SecurityGroupIds=SECURITY_GROUP_IDS
             )
             
-            instance_id = response['Instances'][0]['InstanceId']
-            print(f'Successfully launched instance {instance_id}')
-            print(f'Remaining instances: {instances_remaining-1}/{target_count}')
-            
+            # MinCount=1 allows partial fulfillment; the remainder is requested next iteration
+            instance_ids = [instance['InstanceId'] for instance in response['Instances']]
+            instances_remaining -= len(instance_ids)
+            logger.info("Successfully launched instances %s", ", ".join(instance_ids))
+            logger.info("Remaining instances: %d/%d", instances_remaining, target_count)
+
             # 发送SNS通知
-            try:
-                sns_client.publish(
-                    TopicArn=SNS_TOPIC_ARN,
-                    Message=f"EC2 instance successfully launched!\nInstance ID: {instance_id}\nInstance Type: {instance_type}",
-                    Subject=f"EC2 Instance {instance_id} Launch Notification"
-                )
-                print(f"Launch notification sent for instance {instance_id}")
-            except Exception as sns_error:
-                print(f"Failed to send notification: {str(sns_error)}")
-            
-            instances_remaining -= 1
+            for instance_id in instance_ids:
+                notify_queue.put((instance_id, instance_type))
+
             retry_attempts = 0  # Reset retry counter after success
             
         except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code not in RETRYABLE_EC2_ERRORS:
+                raise  # Re-raise errors the client already retried or cannot recover from
             retry_attempts += 1
-            if not handle_api_errors(e, instance_type):
-                raise  # Re-raise unhandled errors
-                
-            print(f'Retrying in {retry_interval} seconds (attempt {retry_attempts}/{max_retry})')
-            time.sleep(retry_interval)
+            logger.warning("%s for %s, retrying...", error_code, instance_type)
+
+            delay = backoff_delay(retry_attempts, retry_interval)
+            logger.info("Retrying in %.1f seconds (attempt %d/%d)", delay, retry_attempts, max_retry)
+            if wait_for_abort(delay):
+                break
+
+    if abort_requested and instances_remaining > 0:
+        logger.warning("Aborted with %d/%d instances not launched", instances_remaining, target_count)
+    return instances_remaining
 
 def main() -> None:
     """Main execution flow with command-line arguments."""
@@ -156,29 +307,49 @@ def main() -> None:
     parser.add_argument('-c', '--count', type=int, default=1,
                         help='Number of instances to create (default: 1)')
     parser.add_argument('-i', '--retry-interval', type=int, default=10,
-                        help='Retry interval in seconds (default: 10)')
+                        help='Capacity retry interval in seconds; backoff is capped at 8x this value (default: 10)')
     parser.add_argument('-r', '--max-retry', type=int, default=10,
-                        help='Max retry (default: 10)')
+                        help='Max retry per API call and for insufficient capacity (default: 10)')
     
     args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
     
     if args.count < 1:
-        print("Error: Instance count must be at least 1")
+        logger.error("Instance count must be at least 1")
         exit(1)
 
-    ec2 = create_ec2_client(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    session = create_session(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    config = create_client_config(args.max_retry)
+    ec2 = create_ec2_client(session, config)
+    # 创建SNS客户端
+    sns = create_sns_client(session, config)
+
+    signal.signal(signal.SIGINT, handle_sigint)
+    notify_queue, notifier = start_notification_worker(sns)
     
     try:
-        launch_instances(
+        instances_remaining = launch_instances(
             ec2_client=ec2,
+            notify_queue=notify_queue,
             instance_type=args.instance_type,
             target_count=args.count,
             retry_interval=args.retry_interval,
             max_retry=args.max_retry
         )
+    except KeyboardInterrupt:
+        logger.warning("Aborted")
+        exit(130)
     except Exception as e:
-        print(f'Critical error: {str(e)}')
+        logger.error("Critical error: %s", e)
         exit(1)
+    finally:
+        # Notifications for instances that did launch are still delivered
+        stop_notification_worker(notify_queue, notifier)
+
+    # Ctrl-C during a RunInstances call that launched everything is not an abort
+    if abort_requested and instances_remaining > 0:
+        exit(130)
 
 if __name__ == '__main__':
     main()
@@ -6,24 +6,31 @@ Last Modified: 2025-04-17
 AWS SageMaker Endpoint Creation Automation Script
 
 Usage:
-    python sagemaker-auto-create.py -m MODEL_NAME -t INSTANCE_TYPE
+    python sagemaker-auto-create.py -m MODEL_NAME [MODEL_NAME ...] -t INSTANCE_TYPE
 
 Required Environment Variables:
     AWS_ACCESS_KEY_ID: Your AWS access key ID
     AWS_SECRET_ACCESS_KEY: Your AWS secret access key
 
 Arguments:
-    -m, --model-name MODEL_NAME      Name of the model to deploy
+    -m, --model-name MODEL_NAME      Name(s) of the model(s) to deploy, deployed in parallel
     -t, --instance-type INSTANCE_TYPE SageMaker instance type (e.g. ml.m5.large)
-    -i, --retry-interval INTERVAL    Retry interval in seconds (default: 10)
-    -r, --max-retries MAX_RETRIES    Maximum number of retry attempts (default: 10)
+    -i, --retry-interval INTERVAL    Deprecated and ignored; retries use botocore adaptive backoff
+    -r, --max-retries MAX_RETRIES    Maximum number of retry attempts per API call (default: 10)
+    --async                          Deploy as an Asynchronous Inference endpoint that scales to zero
+    --s3-output-path S3_URI          S3 location for async inference results (required with --async)
+    --max-concurrent-invocations N   Async invocations per instance (default: 4)
+    --max-capacity N                 Max instances for async autoscaling (default: 2)
+    -p, --max-parallel-requests N    Max models deployed concurrently (default: cpu_count * 5)
 
 Examples:
     python sagemaker-auto-create.py -m my-model -t ml.m5.large
-    python sagemaker-auto-create.py --model-name my-model --instance-type ml.m5.large --retry-interval 15
+    python sagemaker-auto-create.py -m model-a model-b model-c -t ml.m5.large -p 8
+    python sagemaker-auto-create.py --model-name my-model --instance-type ml.m5.large --max-retries 15
+    python sagemaker-auto-create.py -m my-model -t ml.g5.xlarge --async --s3-output-path s3://my-bucket/async-output
 
 Error Handling:
-    - Retries for common SageMaker API errors
+    - Throttling, 5xx and network errors are retried by botocore's adaptive retry mode
     - Exits with error code 1 for critical failures
 
 DISCLAIMER: This code is provided for educational and informational purposes only.
@@ -33,10 +40,12 @@ this code assume no responsibility for any damages or losses that may arise from
 the use of this code.
 """
 import os
-import time
+import logging
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Constants
@@ -47,38 +56,71 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 MAX_RETRIES = 10
 RETRY_INTERVAL = 10
 SNS_TOPIC_ARN = "arn:aws-cn:sns:xxx"  # sns topic arn
+MAX_POOL_CONNECTIONS = 50             # Minimum HTTP connections per client
+ENDPOINT_TAGS = [{'Key': 'auto-created', 'Value': 'true'}]  # Tags applied to created endpoints
+MAX_PARALLEL_REQUESTS = (os.cpu_count() or 1) * 5  # Concurrent deployments (I/O bound)
 
-def create_sagemaker_client(access_key: str, secret_key: str) -> boto3.client:
-    """Create and configure SageMaker client with AWS credentials."""
+logger = logging.getLogger(__name__)
+
+# Asynchronous Inference autoscaling
+ASYNC_MAX_CONCURRENT_INVOCATIONS = 4      # Concurrent invocations per instance
+ASYNC_MAX_CAPACITY = 2                    # Max instances the endpoint can scale out to
+ASYNC_TARGET_BACKLOG_PER_INSTANCE = 5.0   # Queued requests per instance before scaling out
+ASYNC_SCALE_COOLDOWN = 300                # Scale in/out cooldown in seconds
+
+def create_session(access_key: str, secret_key: str) -> boto3.Session:
+    """Create a boto3 session with AWS credentials, shared by all clients."""
     return boto3.Session(
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key
-    ).client('sagemaker')
+    )
 
-def config_exists(sagemaker_client: boto3.client, config_name: str) -> bool:
-    """Check if an endpoint configuration exists."""
-    try:
-        sagemaker_client.describe_endpoint_config(EndpointConfigName=config_name)
-        return True
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ValidationException':
-            return False
-        raise
+def create_client_config(max_retries: int, max_parallel_requests: int) -> Config:
+    """Build the client config shared by all clients.
 
-def handle_api_errors(error: ClientError) -> bool:
-    """Handle common SageMaker API errors with appropriate retry logic."""
-    error_code = error.response['Error']['Code']
-    retry_errors = {
-        'ThrottlingException': 'API request throttled',
-        'ServiceUnavailable': 'SageMaker service unavailable',
-        'InternalFailure': 'Internal SageMaker service error'
-    }
+    Retries for throttling, 5xx and transient network errors are delegated to
+    botocore's adaptive retry mode, which adds jittered exponential backoff and
+    a client-side token bucket that slows requests down under throttling.
+    """
+    return Config(
+        max_pool_connections=max(MAX_POOL_CONNECTIONS, max_parallel_requests),
+        retries={'mode': 'adaptive', 'max_attempts': max_retries}
+    )
 
-    if error_code in retry_errors:
-        print(f"{retry_errors[error_code]}, retrying...")
+def create_sagemaker_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure SageMaker client from a shared session."""
+    return session.client('sagemaker', config=config)
+
+def create_sns_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure SNS client from a shared session."""
+    return session.client('sns', config=config)
+
+def create_autoscaling_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure Application Auto Scaling client from a shared session."""
+    return session.client('application-autoscaling', config=config)
+
+def create_cloudwatch_client(session: boto3.Session, config: Config) -> boto3.client:
+    """Create and configure CloudWatch client from a shared session."""
+    return session.client('cloudwatch', config=config)
+
+def is_already_exists_error(error: ClientError) -> bool:
+    """Check whether a create call failed because the resource already exists."""
+    error_code = error.response['Error']['Code']
+    if error_code == 'ResourceInUse':
         return True
-    print(f"Unhandled error code: {error_code}")
-    return False
+    # SageMaker reports duplicate names as a ValidationException
+    return (error_code == 'ValidationException'
+            and 'already exist' in error.response['Error'].get('Message', ''))
+
+def build_production_variants(model_name: str, instance_type: str) -> list:
+    """Build the single-variant ProductionVariants list for a model."""
+    return [{
+        'VariantName': 'AllTraffic',
+        'ModelName': model_name,
+        'InstanceType': instance_type,
+        'InitialInstanceCount': 1,
+        'InitialVariantWeight': 1.0
+    }]
 
 def create_endpoint_config(
     sagemaker_client: boto3.client,
@@ -86,120 +128,263 @@ def create_endpoint_config(
     instance_type: str,
     args: argparse.Namespace
 ) -> str:
-    """Create SageMaker endpoint configuration with retry logic."""
+    """Create SageMaker endpoint configuration."""
     config_name = f"{model_name}-config"
     
     config_file_path = 'config.json'
     if os.path.exists(config_file_path):
-        print(f"Config file {config_file_path} already exists. Please delete it first.")
+        logger.error("Config file %s already exists. Please delete it first.", config_file_path)
         return None
 
-    if config_exists(sagemaker_client, config_name):
-        print(f"Endpoint configuration {config_name} already exists. Please delete it first.")
-        return None
+    config_params = {
+        'EndpointConfigName': config_name,
+        'ProductionVariants': build_production_variants(model_name, instance_type)
+    }
+    if args.async_inference:
+        # Async endpoints queue requests and write results to S3, so they can scale to zero
+        config_params['AsyncInferenceConfig'] = {
+            'OutputConfig': {'S3OutputPath': args.s3_output_path},
+            'ClientConfig': {'MaxConcurrentInvocationsPerInstance': args.max_concurrent_invocations}
+        }
 
+    # Create directly instead of describing first; a duplicate name is reported as an error
     try:
-        response = sagemaker_client.create_endpoint_config(
-            EndpointConfigName=config_name,
-            ProductionVariants=[{
-                'VariantName': 'AllTraffic',
-                'ModelName': model_name,
-                'InstanceType': instance_type,
-                'InitialInstanceCount': 1,
-                'InitialVariantWeight': 1.0
-            }]
-        )
-        print(f"Successfully created endpoint configuration: {config_name}")
-        return config_name
+        response = sagemaker_client.create_endpoint_config(**config_params)
     except ClientError as e:
-        if not handle_api_errors(e):
+        if not is_already_exists_error(e):
             raise
-        print(f'Failed to create endpoint configuration: {str(e)}')
-    return None
+        logger.error("Endpoint configuration %s already exists. Please delete it first.", config_name)
+        return None
+    logger.info("Successfully created endpoint configuration: %s", config_name)
+    return config_name
+
+def configure_async_autoscaling(
+    sagemaker_client: boto3.client,
+    autoscaling_client: boto3.client,
+    cloudwatch_client: boto3.client,
+    endpoint_name: str,
+    args: argparse.Namespace
+) -> None:
+    """Register scale-to-zero autoscaling for an Asynchronous Inference endpoint."""
+    resource_id = f"endpoint/{endpoint_name}/variant/AllTraffic"
+    dimension = 'sagemaker:variant:DesiredInstanceCount'
+
+    # The variant can only be registered once the endpoint is InService
+    logger.info("Waiting for endpoint %s to be InService...", endpoint_name)
+    sagemaker_client.get_waiter('endpoint_in_service').wait(EndpointName=endpoint_name)
+
+    autoscaling_client.register_scalable_target(
+        ServiceNamespace='sagemaker',
+        ResourceId=resource_id,
+        ScalableDimension=dimension,
+        MinCapacity=0,
+        MaxCapacity=args.max_capacity
+    )
+
+    # Track queue depth per instance; scales in to zero once the backlog drains
+    autoscaling_client.put_scaling_policy(
+        PolicyName=f"{endpoint_name}-backlog-tracking",
+        ServiceNamespace='sagemaker',
+        ResourceId=resource_id,
+        ScalableDimension=dimension,
+        PolicyType='TargetTrackingScaling',
+        TargetTrackingScalingPolicyConfiguration={
+            'TargetValue': ASYNC_TARGET_BACKLOG_PER_INSTANCE,
+            'CustomizedMetricSpecification': {
+                'MetricName': 'ApproximateBacklogSizePerInstance',
+                'Namespace': 'AWS/SageMaker',
+                'Dimensions': [{'Name': 'EndpointName', 'Value': endpoint_name}],
+                'Statistic': 'Average'
+            },
+            'ScaleInCooldown': ASYNC_SCALE_COOLDOWN,
+            'ScaleOutCooldown': ASYNC_SCALE_COOLDOWN
+        }
+    )
+
+    # Target tracking cannot scale out from zero instances, so add a step policy
+    # triggered by requests queued while no capacity is running
+    policy = autoscaling_client.put_scaling_policy(
+        PolicyName=f"{endpoint_name}-scale-from-zero",
+        ServiceNamespace='sagemaker',
+        ResourceId=resource_id,
+        ScalableDimension=dimension,
+        PolicyType='StepScaling',
+        StepScalingPolicyConfiguration={
+            'AdjustmentType': 'ChangeInCapacity',
+            'MetricAggregationType': 'Average',
+            'Cooldown': ASYNC_SCALE_COOLDOWN,
+            'StepAdjustments': [{'MetricIntervalLowerBound': 0, 'ScalingAdjustment': 1}]
+        }
+    )
+    cloudwatch_client.put_metric_alarm(
+        AlarmName=f"{endpoint_name}-has-backlog-without-capacity",
+        Namespace='AWS/SageMaker',
+        MetricName='HasBacklogWithoutCapacity',
+        Dimensions=[{'Name': 'EndpointName', 'Value': endpoint_name}],
+        Statistic='Average',
+        Period=60,
+        EvaluationPeriods=2,
+        DatapointsToAlarm=2,
+        Threshold=1,
+        ComparisonOperator='GreaterThanOrEqualToThreshold',
+        TreatMissingData='missing',
+        AlarmActions=[policy['PolicyARN']]
+    )
+    logger.info("Configured autoscaling (0-%d instances) for endpoint %s", args.max_capacity, endpoint_name)
 
 def create_endpoint(
     sagemaker_client: boto3.client,
+    sns_client: boto3.client,
     model_name: str,
     config_name: str,
     args: argparse.Namespace
-) -> None:
-    """Create SageMaker endpoint with retry logic."""
+) -> str:
+    """Create SageMaker endpoint; transient errors are retried by the client."""
     endpoint_name = f"{model_name}-endpoint"
-    retry_attempts = 0
-    
-    while retry_attempts < args.max_retries:
+
+    try:
+        response = sagemaker_client.create_endpoint(
+            EndpointName=endpoint_name,
+            EndpointConfigName=config_name,
+            Tags=ENDPOINT_TAGS
+        )
+    except ClientError:
+        # Clean up config if endpoint creation fails
         try:
-            response = sagemaker_client.create_endpoint(
-                EndpointName=endpoint_name,
-                EndpointConfigName=config_name,
-                Tags=[{'Key': 'auto-created', 'Value': 'true'}]
-            )
-            print(f"Successfully created endpoint: {endpoint_name}")
-            
-            # 发送SNS通知
-            try:
-                sns_client = boto3.client('sns',
-                    aws_access_key_id=AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-                )
-                sns_client.publish(
-                    TopicArn=SNS_TOPIC_ARN,
-                    Message=f"SageMaker endpoint successfully created!\nEndpoint Name: {endpoint_name}\nModel Name: {model_name}\nInstance Type: {args.instance_type}",
-                    Subject=f"SageMaker Endpoint {endpoint_name} Creation Notification"
-                )
-                print(f"Creation notification sent for endpoint {endpoint_name}")
-            except Exception as sns_error:
-                print(f"Failed to send notification: {str(sns_error)}")
-            
-            return
-            
-        except ClientError as e:
-            retry_attempts += 1
-            if not handle_api_errors(e):
-                # Clean up config if endpoint creation fails
-                try:
-                    sagemaker_client.delete_endpoint_config(EndpointConfigName=config_name)
-                    print(f"Deleted endpoint configuration: {config_name}")
-                except Exception as cleanup_error:
-                    print(f"Failed to clean up config: {str(cleanup_error)}")
-                raise
-            print(f'Retrying endpoint creation in {args.retry_interval} seconds (attempt {retry_attempts}/{args.max_retries})')
-            time.sleep(args.retry_interval)
+            sagemaker_client.delete_endpoint_config(EndpointConfigName=config_name)
+            logger.info("Deleted endpoint configuration: %s", config_name)
+        except Exception as cleanup_error:
+            logger.error("Failed to clean up config: %s", cleanup_error)
+        raise
+    logger.info("Successfully created endpoint: %s", endpoint_name)
+
+    # 发送SNS通知
+    try:
+        sns_client.publish(
+            TopicArn=SNS_TOPIC_ARN,
+            Message=f"SageMaker endpoint successfully created!\nEndpoint Name: {endpoint_name}\nModel Name: {model_name}\nInstance Type: {args.instance_type}",
+            Subject=f"SageMaker Endpoint {endpoint_name} Creation Notification"
+        )
+        logger.info("Creation notification sent for endpoint %s", endpoint_name)
+    except Exception as sns_error:
+        logger.error("Failed to send notification: %s", sns_error)
+
+    return endpoint_name
+
+def deploy_model(
+    sagemaker_client: boto3.client,
+    sns_client: boto3.client,
+    model_name: str,
+    args: argparse.Namespace
+) -> str:
+    """Create the endpoint configuration and endpoint for a single model."""
+    config_name = create_endpoint_config(
+        sagemaker_client=sagemaker_client,
+        model_name=model_name,
+        instance_type=args.instance_type,
+        args=args
+    )
+    if not config_name:
+        return None
+
+    return create_endpoint(
+        sagemaker_client=sagemaker_client,
+        sns_client=sns_client,
+        model_name=model_name,
+        config_name=config_name,
+        args=args
+    )
 
 def main() -> None:
     """Main execution flow with command-line arguments."""
     parser = argparse.ArgumentParser(
         description='Automate SageMaker endpoint creation with retry logic')
-    parser.add_argument('-m', '--model-name', required=True,
-                        help='Name of the model to deploy')
+    parser.add_argument('-m', '--model-name', required=True, nargs='+',
+                        help='Name(s) of the model(s) to deploy')
     parser.add_argument('-t', '--instance-type', required=True,
                         help='SageMaker instance type (e.g. ml.m5.large)')
     parser.add_argument('-i', '--retry-interval', type=int, default=RETRY_INTERVAL,
-                        help='Retry interval in seconds (default: 10)')
+                        help='Deprecated and ignored; retries use botocore adaptive backoff')
     parser.add_argument('-r', '--max-retries', type=int, default=MAX_RETRIES,
-                        help='Maximum number of retry attempts (default: 10)')
+                        help='Maximum number of retry attempts per API call (default: 10)')
+    parser.add_argument('--async', dest='async_inference', action='store_true',
+                        help='Deploy as an Asynchronous Inference endpoint that scales to zero when idle')
+    parser.add_argument('--s3-output-path',
+                        help='S3 location for async inference results (required with --async)')
+    parser.add_argument('--max-concurrent-invocations', type=int, default=ASYNC_MAX_CONCURRENT_INVOCATIONS,
+                        help='Async invocations per instance (default: 4)')
+    parser.add_argument('--max-capacity', type=int, default=ASYNC_MAX_CAPACITY,
+                        help='Max instances for async autoscaling (default: 2)')
+    parser.add_argument('-p', '--max-parallel-requests', type=int, default=MAX_PARALLEL_REQUESTS,
+                        help='Max models deployed concurrently (default: cpu_count * 5)')
     
     args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.async_inference and not args.s3_output_path:
+        parser.error('--s3-output-path is required with --async')
+    if args.max_capacity < 1:
+        parser.error('--max-capacity must be at least 1')
+    if args.max_concurrent_invocations < 1:
+        parser.error('--max-concurrent-invocations must be at least 1')
+    if args.max_parallel_requests < 1:
+        parser.error('--max-parallel-requests must be at least 1')
     
-    sagemaker = create_sagemaker_client(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    # Duplicate names would deploy the same endpoint twice
+    model_names = list(dict.fromkeys(args.model_name))
+
+    # boto3 Sessions are not thread-safe, so every client is created here on the
+    # main thread; the clients themselves are thread-safe and shared by all deployments
+    session = create_session(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    config = create_client_config(args.max_retries, args.max_parallel_requests)
+    sagemaker = create_sagemaker_client(session, config)
+    sns = create_sns_client(session, config)
+    autoscaling = create_autoscaling_client(session, config)
+    cloudwatch = create_cloudwatch_client(session, config)
     
+    failed = False
+    endpoint_names = []
+    # Not a with-block: its shutdown(wait=True) would hold Ctrl-C until every
+    # in-flight deployment returned
+    pool = ThreadPoolExecutor(max_workers=min(args.max_parallel_requests, len(model_names)))
     try:
-        config_name = create_endpoint_config(
-            sagemaker_client=sagemaker,
-            model_name=args.model_name,
-            instance_type=args.instance_type,
-            args=args
-        )
-        
-        if config_name:
-            create_endpoint(
-                sagemaker_client=sagemaker,
-                model_name=args.model_name,
-                config_name=config_name,
-                args=args
-            )
-    except Exception as e:
-        print(f'Critical error: {str(e)}')
+        futures = {
+            model_name: pool.submit(deploy_model, sagemaker, sns, model_name, args)
+            for model_name in model_names
+        }
+        for model_name, future in futures.items():
+            try:
+                endpoint_name = future.result()
+            except Exception as e:
+                logger.error("Critical error deploying %s: %s", model_name, e)
+                failed = True
+                continue
+            if endpoint_name:
+                endpoint_names.append(endpoint_name)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Aborted")
+        exit(130)
+    pool.shutdown()
+
+    # The InService waiter polls for up to an hour, so it runs here on the main
+    # thread where Ctrl-C can interrupt it. Without scale-to-zero an async
+    # endpoint stays pinned at one instance, so a failure fails the deployment.
+    if args.async_inference:
+        try:
+            for endpoint_name in endpoint_names:
+                try:
+                    configure_async_autoscaling(sagemaker, autoscaling, cloudwatch,
+                                                endpoint_name, args)
+                except Exception as e:
+                    logger.error("Failed to configure autoscaling for %s: %s", endpoint_name, e)
+                    failed = True
+        except KeyboardInterrupt:
+            logger.warning("Aborted")
+            exit(130)
+
+    if failed:
         exit(1)
 
 if __name__ == '__main__':